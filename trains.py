@@ -5,6 +5,8 @@ DA2004 VT2023 - INDU: Trains
 """
 
 import random   # for Train instancing and simulate_turn() method.
+from array import array         # for RailNetwork adjacency arrays.
+from sys import intern          # for sharing station and line name strings.
 
 
 class Station:
@@ -13,6 +15,8 @@ class Station:
     They have a name and a probability of delays occurring at them.
     """
 
+    __slots__ = ('name', 'delay_constant', 'connections', 'moves', 'lines')
+
     def __init__(self, name, delay_constant):
         """
         Constructor.
@@ -31,71 +35,36 @@ class Station:
         self.name = name
         self.delay_constant = delay_constant
         self.connections = []
+        self.moves = {}
+        self.lines = ()
 
-    def verify_stations(filename):
+    def read_lines(filename):
         """
-        Verifies that a file containing station data is formatted correctly.
-        To pass, lines in the file must meet the requirements:
-            1. contains exactly 2 columns, separated by a comma
-            2. column 2 must be a number 0 <= x < 1.
+        Reads a file one line at a time, without line terminators.
 
         Parameters
         ----------
         filename : str
-            Name of the file to be checked.
+            Name of the file to be read.
 
-        Raises
+        Yields
         ------
-        ValueError
-            If file contains lines with bad data, such as an inappropriate
-            number of columns or incorrect type of data.
-
-        Returns
-        -------
-        bool
-            If no issues are found in the file, returns True.
+        line : str
+            Next line of the file, with trailing newline removed.
         """
         with open(filename, 'r') as data:
-            for line in data.readlines():
-                if len(line.strip('\n').split(',')) != 2:
-                    raise ValueError
-                else:
-                    delay = float(line.strip('\n').split(',')[-1])
-                    if delay < 0 or delay >= 1:
-                        raise ValueError
-        return True
-
-
-    def format_stations(file_handle):
-        """
-        Reads data from a file handle and converts the contents into a list.
-
-        Parameters
-        ----------
-        file_handle : file object handle
-            Handle for the file to be parsed.
-
-        Returns
-        -------
-        station_list : list
-            tuple elements of the format:
-                (name = str, delay constant = float)
-        """
-        station_list = []
-        with file_handle as data:
-            for line in data.readlines():
-                line = line.upper().strip('\n').split(',')
-                line_tuple = (line[0], float(line[-1]))
-                # converts column 2 to avoid storing a decimal as str
-                station_list.append(line_tuple)
-        return station_list
+            for line in data:
+                yield line.rstrip('\n')
 
 
     def prime_stations(filename):
         """
-        Driver method for verify_stations and format_stations.
-        Takes a file name, verifies it as a valid source of station data,
-        and converts it into a list for later use.
+        Reads a file containing station data and converts it into a list.
+        Each line is verified and formatted in a single pass over the file,
+        as read by read_lines.
+        To pass, lines in the file must meet the requirements:
+            1. contains exactly 2 columns, separated by a comma
+            2. column 2 must be a number 0 <= x < 1.
 
         Parameters
         ----------
@@ -105,30 +74,36 @@ class Station:
         Raises
         ------
         ValueError
-            If issues are detected by verify_stations.
-        error
-            If another exception is found, such as FileNotFound.
+            If file contains lines with bad data, such as an inappropriate
+            number of columns or incorrect type of data.
+        FileNotFoundError
+            If the file does not exist.
 
         Returns
         -------
-        stations_list : list
-            Output from format_stations.
+        station_list : list
+            tuple elements of the format:
+                (name = str, delay constant = float)
         """
-        try:
-            stations_file = open(filename, 'r')
-            if Station.verify_stations(filename) is True:
-                stations_list = Station.format_stations(stations_file)
-                stations_file.close()
-                return stations_list
-            else:
+        station_list = []
+        for line in Station.read_lines(filename):
+            line = line.split(',')
+            if len(line) != 2:
                 raise ValueError
-        except BaseException as error:
-            raise error
+            delay = float(line[-1])
+            # converts column 2 to avoid storing a decimal as str
+            if delay < 0 or delay >= 1:
+                raise ValueError
+            station_list.append((intern(line[0].upper()), delay))
+            # names are interned, so every copy of a name is the same object
+        return station_list
 
 
-    def verify_connections(filename):
+    def prime_connections(filename):
         """
-        Verifies that a file containing station data is formatted correctly.
+        Reads a file containing connection data and converts it into a list.
+        Each line is verified and formatted in a single pass over the file,
+        as read by read_lines.
         To pass, lines in the file must meet the requirements:
             1. contains exactly 4 columns, separated by a comma
             2. column 4 must be either "s" or "n" (not case sensitive).
@@ -143,31 +118,8 @@ class Station:
         ValueError
             If file contains lines with bad data, such as an inappropriate
             number of columns or incorrect type of data.
-
-        Returns
-        -------
-        bool
-            If no issues are found, returns True.
-        """
-        with open(filename, 'r') as data:
-            for line in data.readlines():
-                line = line.strip('\n').split(',')
-                if len(line) != 4:
-                    raise ValueError
-                elif line[-1] not in ['N', 'n', 'S', 's']:
-                    raise ValueError
-                    # column 4 must represent North/South
-        return True
-
-
-    def format_connections(file_handle):
-        """
-        Reads data from a file handle and converts the contents into a list.
-
-        Parameters
-        ----------
-        file_handle : file_handle : file object handle.
-            Handle for the file to be parsed.
+        FileNotFoundError
+            If the file does not exist.
 
         Returns
         -------
@@ -176,46 +128,16 @@ class Station:
                 (name, connection, line, direction), all elements = str
         """
         connections_list = []
-        with file_handle as data:
-            for line in data.readlines():
-                line = line.upper().strip('\n').split(',')
-                connections_list.append(tuple(line))
-        return connections_list
-
-
-    def prime_connections(filename):
-        """
-        Driver method for verify_connections and format_connections.
-        Takes a file name, verifies it as a valid source of station data,
-        and converts it into a list for later use.
-
-        Parameters
-        ----------
-        filename : str
-            Name of the file to be used.
-
-        Raises
-        ------
-        ValueError
-            If issues are detected by verify_connections.
-        error
-            If another exception is found, such as FileNotFound.
-
-        Returns
-        -------
-        stations_list : list
-            Typically output from format_connections.
-        """
-        try:
-            if Station.verify_connections(filename) is True:
-                connections_file = open(filename, 'r')
-                connections_list = Station.format_connections(connections_file)
-                connections_file.close()
-                return connections_list
-            else:
+        for line in Station.read_lines(filename):
+            line = line.upper().split(',')
+            if len(line) != 4:
                 raise ValueError
-        except BaseException as error:
-            raise error
+            elif line[-1] not in ['N', 'S']:
+                raise ValueError
+                # column 4 must represent North/South
+            connections_list.append((intern(line[0]), intern(line[1]),
+                                     intern(line[2]), line[3]))
+        return connections_list
 
 
     def build_catalog(station_list):
@@ -226,7 +148,7 @@ class Station:
         ----------
         station_list : List
             Data source for dictionary comprehension.
-            Typically output from prime_stations / format_stations.
+            Typically output from prime_stations.
 
         Returns
         -------
@@ -247,70 +169,92 @@ class Station:
         ----------
         stations_list : list
             List containing station information.
-            Typically output from format_stations.
+            Typically output from prime_stations.
         connections_list : list
             List containing connections information.
-            Typically output from format_connections.
+            Typically output from prime_connections.
 
         Returns
         -------
         catalog : dict
             Updated Station class dictionary. Same structure as input,
-            but with connections attribute populated.
+            but with connections, moves and lines attributes populated.
         """
         catalog = Station.build_catalog(stations_list)
+        inverses = []
         for element in connections_list:
             catalog[element[0]].connections.append(element[1:])
-        for element in connections_list:
             if element[-1] == 'S':
                 inverse = (element[0], element[2], 'N')
             else:
                 inverse = (element[0], element[2], 'S')
-            catalog[element[1]].connections.append(inverse)
+            inverses.append((catalog[element[1]], inverse))
             # inverse connections go from b -> a if a -> b exists
+        for station, inverse in inverses:
+            station.connections.append(inverse)
+        # inverses are added after all forward connections, which then
+        # take priority in moves
+        for station in catalog.values():
+            conn_index = {}
+            for connection in station.connections:
+                conn_index.setdefault(connection[1:], connection[0])
+            # (line, course) -> next station, first listed connection wins
+            station.lines = tuple(dict.fromkeys(connection[1] for connection
+                                                in station.connections))
+            # unique lines at station, in order of first appearance
+            for line in station.lines:
+                for course, reverse in (('N', 'S'), ('S', 'N')):
+                    if (line, course) in conn_index:
+                        step = (conn_index[(line, course)], course)
+                    else:
+                        step = (conn_index[(line, reverse)], reverse)
+                        # no match means end station, so course is reversed
+                    station.moves[(line, course)] = step
+            # (line, course) -> (next station, course after moving)
         return catalog
 
 
-    def build_graph(station_catalog):
+    def build_delays(station_catalog):
         """
-        Generates a dictionary containing only Station names
-        and connecting Station names. Used by breadth_first_pathfind method.
+        Generates a dictionary containing only Station names and their
+        delay constants. Used by Train.simulate_turn.
 
         Parameters
         ----------
         station_catalog : dict
             Dictionary of Station class objects.
-            Typically output from build_catalog.
+            Typically output from map_connections.
 
         Returns
         -------
-        graph : dict
+        delays : dict
             Station names are used as keys. (=str)
-            Values are lists of connecting Station names. (elements = str)
+            Values are delay constants. (=float)
         """
-        graph = {key: [] for key in station_catalog.keys()}
-        for key, value in station_catalog.items():
-            for entry in value.connections:
-                graph[key].append(entry[0])
-        return graph
+        delays = {name: station.delay_constant
+                  for name, station in station_catalog.items()}
+        return delays
 
 
     def breadth_first_pathfind(graph, start, goal):
         """
         Finds the shortest path between two stations.
-        Uses "breadth first search" algorithm to find the shortest path.
-
-        Connecting stations are visited in order of distance from the root.
-        Connections at n+1 distance are then stored, and visited later if no
-        path could be found at distance n.
-        As search progresses, the path taken is traced. Stations which have
-        already been searched will not be repeated. Search continues until
-        target is found, or there are no more stations left to search.
+        Uses bidirectional "breadth first search" to find the shortest path.
+
+        Search runs from both ends at once: from the root and from the goal.
+        Each round, the side with fewer stations at its current distance
+        visits all of their connections, and the new stations become its
+        next round. As search progresses, the station each neighbour was
+        reached from is recorded. Stations which have already been reached
+        by a side will not be repeated by that side. Search stops as soon as
+        a station is reached from both sides, or when either side has no
+        more stations left to search.
+        Works because every connection also exists in the inverse direction.
 
         Parameters
         ----------
-        graph : dict
-            Dictionary containig Stations and their direct neighbours.
+        graph : RailNetwork
+            Stations and their direct neighbours.
         start : str
             Root station from which to begin search.
         goal : str
@@ -320,29 +264,91 @@ class Station:
         -------
         shortest_path : list
             If goal station is found, returns the path taken as a list.
-        queue: list
-            If goal station cannot be found, returns the queue (empty list).
+            If goal station cannot be found, returns an empty list.
+        """
+        root = graph.station_index[start]
+        target = graph.station_index.get(goal)
+        if target is None:
+            return []
+        # unknown goal cannot be reached, unknown start raises KeyError
+        indptr = graph.indptr
+        indices = graph.indices
+        parents_fwd = [-1] * len(graph.station_names)
+        parents_fwd[root] = root
+        parents_bwd = [-1] * len(graph.station_names)
+        parents_bwd[target] = target
+        # tracks stations each side has already reached, and where from
+        frontier_fwd = [root]
+        frontier_bwd = [target]
+        while frontier_fwd and frontier_bwd:
+            forward = len(frontier_fwd) <= len(frontier_bwd)
+            if forward:
+                frontier = frontier_fwd
+                parents, other = parents_fwd, parents_bwd
+            else:
+                frontier = frontier_bwd
+                parents, other = parents_bwd, parents_fwd
+            next_frontier = []
+            for station in frontier:
+                for neighbour in indices[indptr[station]:indptr[station + 1]]:
+                    if parents[neighbour] != -1:
+                        continue
+                    parents[neighbour] = station
+                    if other[neighbour] != -1:
+                        # both sides have met, so trace path through neighbour
+                        shortest_path = []
+                        meet = neighbour
+                        while meet != root:
+                            shortest_path.append(meet)
+                            meet = parents_fwd[meet]
+                        shortest_path.append(root)
+                        shortest_path.reverse()
+                        meet = neighbour
+                        while meet != target:
+                            meet = parents_bwd[meet]
+                            shortest_path.append(meet)
+                        return [graph.station_names[i] for i in shortest_path]
+                    next_frontier.append(neighbour)
+            if forward:
+                frontier_fwd = next_frontier
+            else:
+                frontier_bwd = next_frontier
+        # if either side runs out of stations, target could not be found
+        return []
+
+
+class RailNetwork:
+    """
+    RailNetwork objects hold the connections between Stations in
+    compressed sparse row (CSR) form. Stations are numbered in catalog order,
+    and the neighbours of station i are indices[indptr[i]:indptr[i + 1]].
+    """
+
+    __slots__ = ('station_names', 'station_index', 'indptr', 'indices')
+
+    def __init__(self, station_catalog):
+        """
+        Constructor. Walks the connections of every Station once.
+
+        Parameters
+        ----------
+        station_catalog : dict
+            Dictionary of Station class objects.
+            Typically output from map_connections.
+
+        Returns
+        -------
+        None.
         """
-        explored = []
-        # tracks stations that have already been searched
-        queue = [[start]]
-        while queue:
-            search_path = queue.pop(0)
-            station = search_path[-1]
-            # unexplored stations are always at the end of queue elements
-            if station not in explored:
-                connections = graph[station]
-                for neighbour in connections:
-                    shortest_path = list(search_path)
-                    shortest_path.append(neighbour)
-                    # trace path taken
-                    queue.append(shortest_path)
-                    # add search candidate to the queue
-                    if neighbour == goal:
-                        return shortest_path
-                explored.append(station)
-        # if queue becomes empty, target could not be found
-        return queue
+        self.station_names = list(station_catalog.keys())
+        self.station_index = {name: i for i, name
+                              in enumerate(self.station_names)}
+        self.indptr = array('i', [0])
+        self.indices = array('i')
+        for station in station_catalog.values():
+            for connection in station.connections:
+                self.indices.append(self.station_index[connection[0]])
+            self.indptr.append(len(self.indices))
 
 
 
@@ -353,6 +359,8 @@ class Train:
     which line they belong to, and their current course (north-/southbound).
     """
 
+    __slots__ = ('name', 'station', 'line', 'course')
+
     def __init__(self, name, station, line, course):
         """
         Constructor.
@@ -391,7 +399,7 @@ class Train:
         ----------
         station_catalog : dict
             Dictionary containing Station objects and their attributes.
-            Attributes used here are name and connections.
+            Attributes used here are name and lines.
         train_count : int
             Number of trains to be generated.
 
@@ -402,18 +410,14 @@ class Train:
             Keys are generated as natural numbers and converted to str.
 
         """
-        stations = list(station_catalog.keys())
-        courses = ['N', 'S']
-        catalog = {str(n + 1): Train(n + 1, random.choices(stations)[0],
-                                   '', random.choices(courses)[0])
+        stations = random.choices(list(station_catalog.keys()), k=train_count)
+        courses = random.choices(['N', 'S'], k=train_count)
+        # stations and courses are drawn for the whole fleet at once
+        catalog = {str(n + 1): Train(n + 1, stations[n], '', courses[n])
                    for n in range(train_count)}
         # line attribute is empty str, as it depends on assigned station
-        for key in catalog:
-            line_options = []
-            for connection in station_catalog[catalog[key].station].connections:
-                if connection[1] not in line_options:
-                    line_options.append(connection[1])
-            catalog[key].line = random.choice(line_options)
+        for train in catalog.values():
+            train.line = random.choice(station_catalog[train.station].lines)
         # line attribute is now populated based on available connections
         return catalog
 
@@ -441,6 +445,8 @@ class Train:
         Trains first check for connections matching line/course.
         If no match is found, reverses course.
         Finally, moves trains to the next station on their line.
+        Both steps are precomputed per station by map_connections, so a
+        move is a single lookup in the moves attribute.
 
         Parameters
         ----------
@@ -455,21 +461,16 @@ class Train:
             (to identify issues like broken connections in rail network)
 
         """
-        connections_data = [connection[1:] for connection
-                            in station_catalog[self.station].connections]
-        match = (self.line, self.course) in connections_data
-        # if no match is found, train is at end station
-        if match == False:
+        step = station_catalog[self.station].moves.get((self.line, self.course))
+        # moves already accounts for reversing course at end stations
+        if step is None:
             self.reverse()
-            # reverse course since train must be at end station
-        for connection in station_catalog[self.station].connections:
-            if self.line in connection and self.course in connection:
-                self.station = connection[0]
-                return True
-        return False
+            return False
+        self.station, self.course = step
+        return True
 
 
-    def simulate_turn(station_catalog, train_catalog):
+    def simulate_turn(station_catalog, train_catalog, delays):
         """
         Simulates railway network model, increments by 1 time unit (1 "turn").
         Trains first roll a delay check based on their current station.
@@ -484,6 +485,9 @@ class Train:
             Dictionary containing Station objects and their attributes.
         train_catalog : dict
             Dictionary containing Train objects and their attributes.
+        delays : dict
+            Dictionary containing delay constants of Stations.
+            Typically output from Station.build_delays.
 
         Returns
         -------
@@ -491,13 +495,15 @@ class Train:
             Returns updated Train object dictionary.
 
         """
-        for train in train_catalog.values():
-            current_location = station_catalog[train.station]
-            if float(current_location.delay_constant) > random.random():
+        roll = random.random
+        move = Train.move
+        trains = train_catalog.values()
+        # bound to locals to skip repeated global/attribute lookups in loop
+        for train in trains:
+            if delays[train.station] > roll():
                 continue
             # roll for delay
-            else:
-                train.move(station_catalog)
+            move(train, station_catalog)
         return train_catalog
 
 
@@ -511,15 +517,9 @@ class Train:
             Train name, line, course, and station.
 
         """
-        output = ''
-        if self.course == 'N':
-            output += 'Train ' + str(self.name) + ' on ' + self.line + ' line '
-            output += 'Northbound is at station ' + self.station + '.\n'
-            return output
-        else:
-            output += 'Train ' + str(self.name) + ' on ' + self.line + ' line '
-            output += 'Southbound is at station ' + self.station + '.\n'
-            return output
+        direction = 'Northbound' if self.course == 'N' else 'Southbound'
+        return (f'Train {self.name} on {self.line} line {direction} '
+                f'is at station {self.station}.\n')
 
 
 def submenu_2(train_catalog):
@@ -547,7 +547,7 @@ def submenu_2(train_catalog):
               'listed range.\n')
 
 
-def submenu_3(station_catalog):
+def submenu_3(graph):
     """
     User menu for breath_first_pathfind method.
     Validates user input as existing nonequal Station keys.
@@ -559,8 +559,8 @@ def submenu_3(station_catalog):
 
     Parameters
     ----------
-    station_catalog : dict
-        Dictionary containing Station objects and their attributes.
+    graph : RailNetwork
+        Stations and their direct neighbours.
 
     Raises
     ------
@@ -586,7 +586,6 @@ def submenu_3(station_catalog):
         elif steps < 0:
             raise ValueError
         else:
-            graph = Station.build_graph(station_catalog)
             path = Station.breadth_first_pathfind(graph, root, goal)
             if len(path) == 0:
                 print('No route found between stations', root,
@@ -608,7 +607,7 @@ def submenu_3(station_catalog):
         print('Invalid input. Number must be a positive integer.\n')
 
 
-def simulation_menu(station_catalog, train_catalog):
+def simulation_menu(station_catalog, train_catalog, graph, delays):
     """
     Main menu for railway network model. User may choose to:
         1. Run simulation
@@ -623,6 +622,10 @@ def simulation_menu(station_catalog, train_catalog):
         Dictionary containing Station objects and their attributes.
     train_catalog : dict
         Dictionary containing Train objects and their attributes.
+    graph : RailNetwork
+        Stations and their direct neighbours.
+    delays : dict
+        Dictionary containing delay constants of Stations.
 
     Returns
     -------
@@ -636,12 +639,12 @@ def simulation_menu(station_catalog, train_catalog):
                         'To access route information, enter [3]\n'
                         'To exit, enter [Q]\n')
         if choice == '1':
-            Train.simulate_turn(station_catalog, train_catalog)
+            Train.simulate_turn(station_catalog, train_catalog, delays)
             print('Simulation successfully incremented by 1 time unit.\n')
         elif choice == '2':
             submenu_2(train_catalog)
         elif choice == '3':
-            submenu_3(station_catalog)
+            submenu_3(graph)
         elif choice in ['Q', 'q']:
             print('Shutting down. Have a nice day!')
             break
@@ -659,8 +662,9 @@ def main():
     -------
     None.
     Primes simulation by calling Station.prime_stations,
-    Station.prime_connections, Station.map_connections, and
-    Train.build_catalog, then proceeds to simulation_menu.
+    Station.prime_connections, Station.map_connections, RailNetwork,
+    Station.build_delays, and Train.build_catalog, then proceeds to
+    simulation_menu.
 
     """
     print('Welcome. To begin, please provide simulation parameters.\n')
@@ -681,6 +685,9 @@ def main():
             file_2 = input('Enter name of connections file:\n')
             connections_list = Station.prime_connections(file_2)
             station_catalog = Station.map_connections(stations_list, connections_list)
+            graph = RailNetwork(station_catalog)
+            delays = Station.build_delays(station_catalog)
+            # station network is fixed from here on, so these are built once
             loop = 2
         except FileNotFoundError:
             print('Cannot open', file_2 + '. Please try again.\n')
@@ -697,7 +704,7 @@ def main():
                 train_catalog = Train.build_catalog(station_catalog, train_count)
             print('Simulation primed successfully. You may now choose a function.\n')
             loop = False
-            simulation_menu(station_catalog, train_catalog)
+            simulation_menu(station_catalog, train_catalog, graph, delays)
         except ValueError:
             print('Input must be a positive integer. Please try again.\n')
 